@@ -0,0 +1,34 @@
+"""Gunicorn settings for serving the hub on Linux/macOS.
+
+    gunicorn -c gunicorn_conf.py hub.main:app
+
+Gunicorn doesn't run on Windows; there `python hub/main.py` serves the app
+with waitress instead.
+"""
+import os
+import threading
+
+bind = os.getenv("BIND", "0.0.0.0:5000")
+
+# A single worker process: the background CSV/DB writer, the AI caches and the
+# /recent buffer all live in-process, and several workers would append to the
+# same CSV file concurrently.
+workers = 1
+
+# Threads rather than gevent: psycopg2 blocks the whole process under gevent
+# (it isn't monkey-patchable without psycogreen), which would stall every
+# greenlet while a query runs. Threads overlap the Groq and Postgres waits.
+worker_class = "gthread"
+threads = int(os.getenv("THREADS", "16"))
+keepalive = 30
+
+# Serve HTTPS with the certificates created by setup_certs.py, if present
+if os.path.exists("certs/localhost.pem") and os.path.exists("certs/localhost-key.pem"):
+    certfile = "certs/localhost.pem"
+    keyfile = "certs/localhost-key.pem"
+
+
+def when_ready(server):
+    # Start the ngrok tunnel once, from the master, as `python hub/main.py` does
+    from hub.main import start_ngrok
+    threading.Thread(target=start_ngrok, daemon=True).start()
@@ -1,23 +1,90 @@
-from flask import Flask, request, render_template, jsonify
+from flask import Flask, Response, request, render_template, jsonify, stream_with_context
+from flask.json.provider import DefaultJSONProvider
+from flask_compress import Compress
+from jinja2 import FileSystemBytecodeCache
+import orjson
+import csv
+import io
 import json
+import logging
 from datetime import datetime
 import os
-import pandas as pd
 from dotenv import load_dotenv
+from waitress import serve
 import psycopg2
+from psycopg2.pool import ThreadedConnectionPool
 from groq import Groq
+import sqlglot
+from sqlglot import expressions as exp
+import numpy as np
+try:
+    from sentence_transformers import SentenceTransformer
+except ImportError:  # optional: without it only exact repeat questions are cached
+    SentenceTransformer = None
 import subprocess
 import threading
+import queue
+import atexit
 import time
 import requests
 import re
+import socket
+import string
+import hashlib
+import uuid
+import weakref
+from collections import OrderedDict, deque
+from contextlib import contextmanager
 
 # --- Load environment variables ---
 load_dotenv()
 DB_URL = os.getenv("DATABASE_URL")
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 
+# Set LOG_LEVEL=DEBUG to trace requests and the AI pipeline; at the default
+# INFO level the debug messages (and their arguments) are never formatted.
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper(), format="[%(levelname)s] %(message)s")
+logger = logging.getLogger(__name__)
+
+# Allow non-string dict keys (e.g. integer team numbers) and numpy values in responses
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson.
+
+    Types orjson can't serialize natively (e.g. the Decimal values Postgres
+    returns for ROUND(AVG(...))) fall back to Flask's default conversions.
+    """
+
+    def _options(self):
+        option = ORJSON_OPTIONS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            option |= orjson.OPT_INDENT_2
+        return option
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default, option=self._options()).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        body = orjson.dumps(obj, default=self.default, option=self._options() | orjson.OPT_APPEND_NEWLINE)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
+
+# Compress JSON (notably the /fetch-database-data table dump) and pages for
+# clients that accept it. /ask's event stream is deliberately left out so each
+# summary chunk reaches the browser as soon as it is sent.
+app.config['COMPRESS_MIMETYPES'] = ['application/json', 'text/html']
+app.config['COMPRESS_MIN_SIZE'] = 1024
+app.config['COMPRESS_LEVEL'] = 6
+Compress(app)
 
 @app.route('/')
 def frontend():
@@ -49,264 +116,1228 @@ def query_ai():
     """Handle AI queries."""
     try:
         data = request.get_json()
-        print(f"[DEBUG] Received data for AI query: {data}")
+        logger.debug("Received data for AI query: %s", data)
 
         if not data or 'query' not in data:
-            print("[ERROR] No query provided in the request.")
+            logger.error("No query provided in the request.")
             return jsonify({"error": "No query provided."}), 400
 
         question = data['query']
-        print(f"[DEBUG] Query extracted: {question}")
+        logger.debug("Query extracted: %s", question)
 
-        result = ask_groq(question)
-        print(f"[DEBUG] AI pipeline result: {result}")
+        result = ask_groq(question, use_cache=request.args.get("no_cache") != "1")
+        logger.debug("AI pipeline result: %s", result)
 
         return jsonify(result)
     except Exception as e:
-        print(f"[ERROR] Exception in /query-ai: {e}")
+        logger.exception("Exception in /query-ai: %s", e)
         return jsonify({"error": str(e)}), 500
 
 @app.route('/fetch-database-data', methods=['GET'])
 def fetch_database_data():
-    """Fetch all data from the match_scouting table."""
+    """Fetch all data from the match_scouting table, streamed as a JSON array."""
+    rows = stream_sql("SELECT * FROM match_scouting;")
     try:
-        query = "SELECT * FROM match_scouting;"
-        data = run_sql_query(query)
-        return jsonify(data)
+        first = next(rows)  # runs the query, so failures can still be reported as JSON
     except Exception as e:
         return jsonify({"error": str(e)})
 
+    def generate():
+        yield first
+        yield from rows
+
+    return Response(generate(), mimetype="application/json")
+
+@app.route('/team-stats', methods=['GET'])
+def team_stats():
+    """Per-team aggregates from the team_stats view, one row per team."""
+    try:
+        return jsonify(run_sql_query("SELECT * FROM team_stats ORDER BY team"))
+    except Exception as e:
+        logger.error("Fetching team stats failed: %s", e)
+        return jsonify({"error": str(e)}), 500
+
 # --- Directory setup ---
 DOCS_DIR = os.path.join(os.path.expanduser('~'), 'Documents')
 FRC_DATA_DIR = os.path.join(DOCS_DIR, 'FRC Scouting Data')
 CSV_DIR = os.path.join(FRC_DATA_DIR, 'csv')
-for d in [FRC_DATA_DIR, CSV_DIR]:
+JINJA_CACHE_DIR = os.path.join(FRC_DATA_DIR, 'jinja_cache')
+for d in [FRC_DATA_DIR, CSV_DIR, JINJA_CACHE_DIR]:
     os.makedirs(d, exist_ok=True)
 CURRENT_CSV = os.path.join(CSV_DIR, "scouting_data_current.csv")
-processed_data = []
+
+# Keep compiled templates on disk so restarts skip Jinja compilation. Jinja
+# invalidates an entry when its template source changes.
+app.jinja_env.bytecode_cache = FileSystemBytecodeCache(directory=JINJA_CACHE_DIR)
+# Most recent submissions, newest last; bounded so it never grows with the event
+processed_data = deque(maxlen=1000)
 
 # --- Database utility ---
-def run_sql_query(query):
-    conn = psycopg2.connect(DB_URL)
-    cur = conn.cursor()
-    cur.execute(query)
-    columns = [desc[0] for desc in cur.description]
-    rows = cur.fetchall()
-    cur.close()
-    conn.close()
-    return [dict(zip(columns, row)) for row in rows]
+DB_POOL_MIN = 2
+DB_POOL_MAX = 10
+_db_pool = None
+_db_pool_lock = threading.Lock()
+# ThreadedConnectionPool raises once all connections are out; this makes
+# borrowers wait for a free connection instead
+_db_pool_slots = threading.BoundedSemaphore(DB_POOL_MAX)
+
+def get_db_pool():
+    """Return the shared connection pool, creating it on first use.
+
+    Created lazily so the hub still starts (and serves the scouting pages)
+    when the database is unreachable.
+    """
+    global _db_pool
+    if _db_pool is None:
+        with _db_pool_lock:
+            if _db_pool is None:
+                _db_pool = ThreadedConnectionPool(DB_POOL_MIN, DB_POOL_MAX, dsn=DB_URL)
+                conn = _db_pool.getconn()
+                try:
+                    # Set up team_stats before the first AI query can ask for it
+                    # (insert_data_to_db retries if this fails)
+                    _ensure_schema(conn)
+                except Exception as e:
+                    logger.exception("Database schema setup failed: %s", e)
+                finally:
+                    _db_pool.putconn(conn)
+    return _db_pool
+
+@contextmanager
+def get_conn():
+    """Borrow a pooled connection for the duration of a `with` block.
+
+    Blocks while all DB_POOL_MAX connections are in use. An open transaction
+    left on the connection is rolled back by the pool before the connection
+    is handed out again.
+    """
+    db_pool = get_db_pool()
+    with _db_pool_slots:
+        conn = db_pool.getconn()
+        try:
+            yield conn
+        finally:
+            db_pool.putconn(conn)
+
+@atexit.register
+def close_db_pool():
+    if _db_pool is not None:
+        _db_pool.closeall()
+
+# Server-side prepared statements, tracked per pooled connection (they live as
+# long as the Postgres session). Repeated queries skip parsing and planning.
+# A query is only prepared the second time it is seen: most AI-generated SQL
+# runs once, and PREPARE costs an extra round-trip with nothing to reuse. The
+# pool also closes connections returned while DB_POOL_MIN are already idle,
+# dropping their statements, so under load a query may be re-prepared on a
+# fresh connection; that costs one round-trip, not a failure.
+PLAN_CACHE_SIZE = 128
+_plan_cache = weakref.WeakKeyDictionary()
+_plan_cache_lock = threading.Lock()
+_seen_queries = OrderedDict()  # statement names run at least once, most recent last
+
+def _seen_before(name):
+    """Record that statement `name` ran; True if it had already run before."""
+    with _plan_cache_lock:
+        if name in _seen_queries:
+            _seen_queries.move_to_end(name)
+            return True
+        _seen_queries[name] = True
+        if len(_seen_queries) > PLAN_CACHE_SIZE * 4:
+            _seen_queries.popitem(last=False)
+        return False
+
+def _prepared_statements(conn):
+    with _plan_cache_lock:
+        prepared = _plan_cache.get(conn)
+        if prepared is None:
+            prepared = _plan_cache[conn] = OrderedDict()
+        return prepared
+
+# Rows of recent parameterless queries, keyed by SQL text. Submissions only
+# reach match_scouting through merge_staged_rows(), which clears this cache;
+# the TTL bounds staleness from changes made outside the hub.
+QUERY_CACHE_SIZE = 256
+QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", "300"))
+_query_cache = OrderedDict()  # sql -> (stored_at, rows)
+_query_cache_lock = threading.Lock()
+_query_cache_generation = 0  # bumped on every clear, so in-flight results from before it aren't stored
+
+def clear_query_cache():
+    global _query_cache_generation
+    with _query_cache_lock:
+        _query_cache.clear()
+        _query_cache_generation += 1
+
+def run_sql_query(query, params=None, use_cache=True):
+    """Run a read query and return its rows as dicts.
+
+    Queries without `params` are answered from the query cache when possible
+    (use_cache=False always queries, then refreshes the cached rows);
+    otherwise a query seen before runs as a per-connection prepared statement
+    and a new one runs directly. Parameterized queries are passed to psycopg2
+    as-is. Cached rows are shared between callers, so treat the result as
+    read-only.
+    """
+    if params is not None:
+        with get_conn() as conn, conn.cursor() as cur:
+            cur.execute(query, params)
+            columns = [desc[0] for desc in cur.description]
+            rows = cur.fetchall()
+        return [dict(zip(columns, row)) for row in rows]
+
+    sql = query.strip().rstrip(";")
+    with _query_cache_lock:
+        cached = _query_cache.get(sql) if use_cache else None
+        if cached is not None and time.monotonic() - cached[0] < QUERY_CACHE_TTL:
+            _query_cache.move_to_end(sql)
+            logger.debug("Query cache hit: %s", sql)
+            return cached[1]
+        generation = _query_cache_generation
+
+    name = "p_" + hashlib.blake2b(sql.encode(), digest_size=8).hexdigest()
+    with get_conn() as conn, conn.cursor() as cur:
+        prepared = _prepared_statements(conn)
+        if name in prepared:
+            prepared.move_to_end(name)
+            cur.execute(f"EXECUTE {name}")
+        elif _seen_before(name):
+            cur.execute(f"PREPARE {name} AS {sql}")
+            prepared[name] = sql
+            if len(prepared) > PLAN_CACHE_SIZE:
+                oldest, _ = prepared.popitem(last=False)
+                cur.execute(f"DEALLOCATE {oldest}")
+            cur.execute(f"EXECUTE {name}")
+        else:
+            cur.execute(sql)
+        columns = [desc[0] for desc in cur.description]
+        rows = cur.fetchall()
+    result = [dict(zip(columns, row)) for row in rows]
+
+    with _query_cache_lock:
+        if generation == _query_cache_generation:
+            _query_cache[sql] = (time.monotonic(), result)
+            _query_cache.move_to_end(sql)
+            if len(_query_cache) > QUERY_CACHE_SIZE:
+                _query_cache.popitem(last=False)
+    return result
+
+STREAM_FETCH_SIZE = 2000  # rows per round-trip (and per response chunk) in stream_sql
+
+def stream_sql(query):
+    """Yield the rows of `query` as chunks of a JSON array.
+
+    Uses a server-side cursor, so memory stays flat however large the table is;
+    the first chunk is produced only after the first rows have been fetched.
+    The connection stays borrowed until the generator finishes or is closed.
+    """
+    with get_conn() as conn, conn.cursor(name="stream_sql") as cur:
+        cur.execute(query)
+        rows = cur.fetchmany(STREAM_FETCH_SIZE)
+        columns = [desc[0] for desc in cur.description]
+        separator = b"["
+        while rows:
+            yield separator + b",".join(
+                orjson.dumps(dict(zip(columns, row)), default=app.json.default, option=ORJSON_OPTIONS)
+                for row in rows)
+            separator = b","
+            rows = cur.fetchmany(STREAM_FETCH_SIZE)
+        yield b"[]" if separator == b"[" else b"]"
 
 # --- Groq AI integration for REBUILT 2026 ---
-def ask_groq(question: str):
-    client = Groq(api_key=GROQ_API_KEY)
+# Static instructions for SQL generation. Kept byte-identical across calls and
+# sent as the system message so Groq can serve it from its prompt cache; only
+# the short user message changes per question.
+SYSTEM_PROMPT = """
+IMPORTANT: You must output ONLY a JSON object with exactly these two keys:
+- "sql": a single, valid PostgreSQL SELECT statement that answers the user's question.
+- "summary_template": one plain-English sentence answering the question when the query returns a single row, with every value written as a {column} placeholder naming a column of your SELECT (alias computed columns). Example: "Team {team} scores the most fuel, averaging {avg_fuel} per match."
+- Do NOT include any explanations, markdown, or extra text outside the JSON object.
+- If the user's request cannot be answered with a SELECT (for example any INSERT/UPDATE/DELETE/DDL or other write operation), set "sql" to exactly "NON_SELECT".
 
-    # Step 1: Generate SQL based on 2026 Game Rules
-    prompt = f"""
-    IMPORTANT: You must output ONLY a single, valid PostgreSQL SELECT statement that answers the user's question.
-    - Wrap the SQL exactly between tags: <SQL>SELECT ...;</SQL>
-    - Do NOT include any explanations, markdown, or extra text outside the tags.
-    - If the user's request cannot be answered with a SELECT (for example any INSERT/UPDATE/DELETE/DDL or other write operation), output exactly: <SQL>NON_SELECT</SQL>
-
-    You are a data analyst for FRC Team "Roboforce". Use the following table schema when writing SQL (Postgres dialect):
-
-    TABLE match_scouting (
-        id SERIAL PRIMARY KEY,
-        match INTEGER,
-        team INTEGER,
-        alliance TEXT,        -- 'red' or 'blue'
-        fuel_balls INTEGER,   -- Teleop Fuel (1pt each)
-        auto_fuel INTEGER,    -- Auto Fuel (1pt each)
-        alliance_pass INTEGER, -- Balls passed to alliance zone
-        is_turreted INTEGER,  -- 1 if yes, 0 if no
-        fits_trench INTEGER,  -- 1 if fits 22" trench
-        climb TEXT,           -- 'no_climb', 'L1', 'L2', 'L3'
-        auto_climb INTEGER,   -- 1 if L1 Auto Climb (15pts)
-        defense INTEGER,      -- 1 if played defense, 0 if no
-        passing INTEGER,      -- 1 if passed to teammates, 0 if no
-        notes TEXT
-    );
-
-    SCORING RULES:
-    1. Fuel: 1pt per ball.
-    2. Teleop Climb: 'L3'=30, 'L2'=20, 'L1'=10.
-    3. Auto Climb: auto_climb value is the points (already 10 or 0).
-    4. Consistency: Smallest (MAX - MIN) range per team.
-    5. Averages: ROUND(AVG(...), 2).
-
-    The user asked: "{question}"
+You are a data analyst for FRC Team "Roboforce". Use the following table schema when writing SQL (Postgres dialect):
+
+TABLE match_scouting (
+    id SERIAL PRIMARY KEY,
+    match INTEGER,
+    team INTEGER,
+    alliance TEXT,        -- 'red' or 'blue'
+    fuel_balls INTEGER,   -- Teleop Fuel (1pt each)
+    auto_fuel INTEGER,    -- Auto Fuel (1pt each)
+    alliance_pass INTEGER, -- Balls passed to alliance zone
+    is_turreted INTEGER,  -- 1 if yes, 0 if no
+    fits_trench INTEGER,  -- 1 if fits 22" trench
+    climb TEXT,           -- 'no_climb', 'L1', 'L2', 'L3'
+    auto_climb INTEGER,   -- 1 if L1 Auto Climb (15pts)
+    defense INTEGER,      -- 1 if played defense, 0 if no
+    passing INTEGER,      -- 1 if passed to teammates, 0 if no
+    notes TEXT
+);
+
+VIEW team_stats (      -- per-team aggregates over match_scouting; prefer it for per-team totals and averages
+    team INTEGER,
+    matches INTEGER,      -- number of scouted matches
+    avg_fuel NUMERIC,     -- ROUND(AVG(fuel_balls), 2)
+    fuel_range INTEGER,   -- MAX(fuel_balls) - MIN(fuel_balls); smaller is more consistent
+    climb_pts INTEGER     -- total teleop climb points
+);
+
+SCORING RULES:
+1. Fuel: 1pt per ball.
+2. Teleop Climb: 'L3'=30, 'L2'=20, 'L1'=10.
+3. Auto Climb: auto_climb value is the points (already 10 or 0).
+4. Consistency: Smallest (MAX - MIN) range per team.
+5. Averages: ROUND(AVG(...), 2).
+"""
+
+SUMMARY_SYSTEM_PROMPT = "You summarize SQL query results for FRC scouts. Provide a simple and clear summary in plain English."
+
+SUMMARY_CACHE_SIZE = 256
+_summary_cache = OrderedDict()
+_summary_cache_lock = threading.Lock()
+
+_groq_client = None
+_groq_client_lock = threading.Lock()
+
+def get_groq_client():
+    """Return the shared Groq client, creating it on first use.
+
+    Reusing one client keeps its HTTPS connection pool warm, so each call skips
+    the TCP/TLS handshake to api.groq.com. Created lazily so a missing
+    GROQ_API_KEY only breaks the AI routes, not the whole hub.
+    """
+    global _groq_client
+    if _groq_client is None:
+        with _groq_client_lock:
+            if _groq_client is None:
+                _groq_client = Groq(api_key=GROQ_API_KEY)
+    return _groq_client
+
+def _normalize_question(question: str) -> str:
+    """Collapse whitespace and case so trivially different questions share cache entries."""
+    return " ".join(question.split()).lower()
+
+def _log_usage(label: str, usage):
+    """Log prompt-token usage, including how much of the prompt Groq served from cache."""
+    if usage is None:
+        return
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached = getattr(details, "cached_tokens", 0) if details else 0
+    logger.debug("Groq %s usage: prompt_tokens=%s cached_tokens=%s", label, usage.prompt_tokens, cached)
+
+def _generate_sql(question: str) -> str:
+    """Ask Groq for SQL answering `question` and return the raw model output."""
+    client = get_groq_client()
+
+    user_message = f'The user asked: "{question}"'
+
+    logger.debug("Sending prompt to Groq API: %s", user_message)
+
+    completion = client.chat.completions.create(
+        model="llama-3.3-70b-versatile",
+        messages=[
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": user_message},
+        ],
+        response_format={"type": "json_object"},
+    )
+    _log_usage("SQL generation", completion.usage)
+    return completion.choices[0].message.content.strip()
+
+def _local_summary(data: list):
+    """Summarize results too simple to need the model; None for anything else."""
+    if not data:
+        return "No data was found for this query."
+    if len(data) == 1 and len(data[0]) == 1:
+        column, value = next(iter(data[0].items()))
+        return f"{column.replace('_', ' ').title()}: {value}."
+    return None
+
+def _fill_template(template: str, row: dict):
+    """Fill the {column} placeholders of a model-written summary template from `row`.
+
+    Returns None if the template uses anything but plain column names from the row.
     """
+    try:
+        placeholders = [(field, spec) for _, field, spec, _ in string.Formatter().parse(template)
+                        if field is not None]
+        if not placeholders or any(field not in row or "{" in spec for field, spec in placeholders):
+            # unknown columns, or nested specs such as {team:{w}}, which pull in other fields
+            return None
+        return template.format_map(row)
+    except (ValueError, TypeError, KeyError, IndexError, AttributeError):
+        return None
+
+def _summarize_stream(question: str, sql_query: str, data: list, template: str = None,
+                      use_cache: bool = True):
+    """Yield the Groq summary of `data` as it is generated.
+
+    Single-row results are summarized with the template written alongside the
+    SQL, and empty and single-value results are summarized locally. Finished
+    summaries are cached, so identical results are answered at once (as a
+    single chunk) without another completion; use_cache=False skips that lookup.
+    """
+    local = _fill_template(template, data[0]) if template and len(data) == 1 else None
+    if local is None:
+        local = _local_summary(data)
+    if local is not None:
+        logger.debug("Result summarized locally")
+        yield local
+        return
+
+    key = hashlib.blake2b(repr((_normalize_question(question), sql_query, data)).encode(),
+                          digest_size=16).hexdigest()
+    with _summary_cache_lock:
+        if use_cache and key in _summary_cache:
+            _summary_cache.move_to_end(key)
+            logger.debug("Summary cache hit")
+            yield _summary_cache[key]
+            return
+
+    client = get_groq_client()
+    summary_prompt = f"User asked: '{question}'. Results: {data}."
+    logger.debug("Sending summary prompt to Groq API: %s", summary_prompt)
 
-    print(f"[DEBUG] Sending prompt to Groq API: {prompt}")
+    stream = client.chat.completions.create(
+        model="llama-3.3-70b-versatile",
+        messages=[
+            {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
+            {"role": "user", "content": summary_prompt},
+        ],
+        stream=True,
+    )
+    parts = []
+    for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            parts.append(chunk.choices[0].delta.content)
+            yield chunk.choices[0].delta.content
+        x_groq = getattr(chunk, "x_groq", None)
+        _log_usage("summary", getattr(chunk, "usage", None) or getattr(x_groq, "usage", None))
+    summary_text = "".join(parts).strip()
+
+    with _summary_cache_lock:
+        _summary_cache[key] = summary_text
+        if len(_summary_cache) > SUMMARY_CACHE_SIZE:
+            _summary_cache.popitem(last=False)
+
+# --- AI answer cache ---
+# Full /ask responses are reused for repeated questions. Exact repeats are
+# matched on a hash of the normalized question; when sentence-transformers is
+# installed, near-duplicate phrasings are matched by embedding similarity too,
+# provided they mention the same numbers: "team 254" and "team 1678" embed
+# almost identically but need different answers.
+ANSWER_CACHE_SIZE = 1000
+ANSWER_CACHE_TTL = float(os.getenv("AI_CACHE_TTL", "300"))  # seconds
+SEMANTIC_CACHE_THRESHOLD = 0.92
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+_answer_cache = OrderedDict()  # sha256(question) -> (stored_at, embedding or None, numbers, response)
+_NUMBER = re.compile(r"\d+(?:\.\d+)?")
+_answer_cache_lock = threading.Lock()
+_embedder = None
+_embedder_lock = threading.Lock()
+_semantic_cache_disabled = SentenceTransformer is None
 
+def _embed_question(question: str):
+    """Return a unit-length embedding for `question`, or None if unavailable."""
+    global _embedder, _semantic_cache_disabled
+    if _semantic_cache_disabled:
+        return None
     try:
-        completion = client.chat.completions.create(
-            model="llama-3.3-70b-versatile",
-            messages=[{"role": "user", "content": prompt}],
-        )
-        sql_query = completion.choices[0].message.content.strip()
-        print(f"[DEBUG] Groq API response: {sql_query}")
+        if _embedder is None:
+            with _embedder_lock:
+                if _embedder is None:
+                    _embedder = SentenceTransformer(EMBEDDING_MODEL)
+        return _embedder.encode(question, normalize_embeddings=True)
     except Exception as e:
-        print(f"[ERROR] Groq API call failed: {e}")
-        return {"error": str(e)}
+        # e.g. the model can't be downloaded offline; fall back to exact matches only
+        logger.warning("Question embedding failed, disabling semantic cache: %s", e)
+        _semantic_cache_disabled = True
+        return None
+
+def lookup_answer(question_key: str, embedding):
+    """Return a cached response for this question (or a near-duplicate), else None."""
+    key = hashlib.sha256(question_key.encode()).hexdigest()
+    cutoff = time.monotonic() - ANSWER_CACHE_TTL
+    with _answer_cache_lock:
+        # Drop expired entries; the dict is in insertion/LRU order, oldest first
+        for old_key in [k for k, (stored_at, _, _, _) in _answer_cache.items() if stored_at < cutoff]:
+            del _answer_cache[old_key]
+
+        if key in _answer_cache:
+            _answer_cache.move_to_end(key)
+            return _answer_cache[key][3]
+
+        if embedding is None:
+            return None
+        numbers = _NUMBER.findall(question_key)
+        candidates = [(k, emb) for k, (_, emb, nums, _) in _answer_cache.items()
+                      if emb is not None and nums == numbers]
+        if not candidates:
+            return None
+        sims = np.stack([emb for _, emb in candidates]) @ embedding
+        best = int(np.argmax(sims))
+        if sims[best] < SEMANTIC_CACHE_THRESHOLD:
+            return None
+        hit_key = candidates[best][0]
+        _answer_cache.move_to_end(hit_key)
+        logger.debug("Semantic cache hit (similarity %.3f)", sims[best])
+        return _answer_cache[hit_key][3]
+
+def store_answer(question_key: str, embedding, response: dict):
+    key = hashlib.sha256(question_key.encode()).hexdigest()
+    with _answer_cache_lock:
+        _answer_cache[key] = (time.monotonic(), embedding, _NUMBER.findall(question_key), response)
+        _answer_cache.move_to_end(key)
+        while len(_answer_cache) > ANSWER_CACHE_SIZE:
+            _answer_cache.popitem(last=False)
+
+def clear_answer_cache():
+    """Forget cached answers, e.g. after new scouting data is stored."""
+    with _answer_cache_lock:
+        _answer_cache.clear()
+
+# Patterns applied to every model response, compiled once
+_SQL_TAG = re.compile(r"<SQL>(.*?)</SQL>", re.IGNORECASE | re.DOTALL)
+_QUERY_START = re.compile(r"^\s*WITH\b|\bSELECT\b", re.IGNORECASE | re.MULTILINE)
+
+# Statements (anywhere in the tree, including CTEs) that make a query unsafe to run.
+UNSAFE_SQL_NODES = (exp.Insert, exp.Update, exp.Delete, exp.Merge, exp.Create, exp.Drop,
+                    exp.Alter, exp.TruncateTable, exp.Command, exp.Into, exp.Lock)
 
-    sql_query = sql_query.replace('```sql', '').replace('```', '').strip()
+def _rewrite_auto_climb_points(tree):
+    """Turn `auto_climb * 15` into a CASE that scores 15 for any auto climb.
+
+    Postgres rejects boolean * integer, and CASting to INT first works whether
+    auto_climb is stored as a boolean or as 10/0 points.
+    """
+    for mul in list(tree.find_all(exp.Mul)):
+        for column, factor in ((mul.this, mul.expression), (mul.expression, mul.this)):
+            if (isinstance(column, exp.Column) and column.name.lower() == "auto_climb"
+                    and isinstance(factor, exp.Literal) and factor.is_number and factor.this == "15"):
+                climbed = exp.NEQ(this=exp.cast(column.copy(), "INT"), expression=exp.Literal.number(0))
+                mul.replace(exp.Case().when(climbed, exp.Literal.number(15)).else_(exp.Literal.number(0)))
+                logger.debug("Rewrote %s to avoid boolean*int", mul.sql(dialect="postgres"))
+                break
+
+def validate_select(sql_content: str):
+    """Parse model output and return it as a single canonical read-only query.
+
+    Returns None if it doesn't parse, holds more than one statement, isn't a
+    query (SELECT / UNION / WITH ... SELECT), or contains any write, DDL,
+    SELECT INTO or row-locking clause. `auto_climb * 15` is rewritten on the
+    way (see _rewrite_auto_climb_points).
+    """
+    # Drop any prose the model put before the query itself
+    start = _QUERY_START.search(sql_content)
+    if start:
+        sql_content = sql_content[start.start():]
+
+    try:
+        statements = [tree for tree in sqlglot.parse(sql_content, read="postgres") if tree is not None]
+    except sqlglot.errors.SqlglotError as e:
+        logger.debug("Model output is not valid SQL: %s", e)
+        return None
+
+    if len(statements) != 1:
+        logger.debug("Expected one statement, got %s: %s", len(statements), sql_content)
+        return None
+    tree = statements[0]
+    if not isinstance(tree, exp.Query) or tree.find(*UNSAFE_SQL_NODES) is not None:
+        logger.debug("Non-SELECT SQL detected in model output: %s", sql_content)
+        return None
+    _rewrite_auto_climb_points(tree)
+    return tree.sql(dialect="postgres")
+
+# SQL (with its summary template) that was generated, validated and ran
+# successfully, keyed by a hash of the normalized question. Repeat questions
+# skip the SQL-generation call but still query fresh data.
+SQL_CACHE_SIZE = 512
+SQL_CACHE = OrderedDict()
+_sql_cache_lock = threading.Lock()
+
+def _sql_from_text(text: str) -> str:
+    """Pull the SQL out of a free-text model response (markdown fences, <SQL> tags)."""
+    text = text.replace('```sql', '').replace('```', '').strip()
 
     # If the model wrapped its result in <SQL> tags, extract that content; otherwise use the full output
-    m = re.search(r"<SQL>(.*?)</SQL>", sql_query, flags=re.IGNORECASE | re.DOTALL)
+    m = _SQL_TAG.search(text)
     if m:
-        sql_content = m.group(1).strip()
-        print(f"[DEBUG] Extracted SQL from <SQL> tags: {sql_content}")
+        logger.debug("Extracted SQL from <SQL> tags: %s", m.group(1).strip())
+        return m.group(1).strip()
+    logger.debug("No <SQL> tags found; using full response: %s", text)
+    return text
+
+def _sql_for_question(question: str):
+    """Step 1 of the AI pipeline: have Groq write the SQL, then vet it.
+
+    Returns {"query", "summary_template"} on success, or a dict with an
+    "error" key.
+    """
+    # Step 1: Generate SQL based on 2026 Game Rules
+    try:
+        sql_query = _generate_sql(question)
+        logger.debug("Groq API response: %s", sql_query)
+    except Exception as e:
+        logger.error("Groq API call failed: %s", e)
+        return {"error": str(e)}
+
+    # The model answers with {"sql", "summary_template"}; anything else is
+    # treated as bare SQL (optionally fenced or in <SQL> tags) with no template
+    template = None
+    try:
+        generated = orjson.loads(sql_query)
+    except orjson.JSONDecodeError:
+        generated = None
+    if isinstance(generated, dict):
+        sql_content = str(generated.get("sql") or "").strip()
+        if isinstance(generated.get("summary_template"), str):
+            template = generated["summary_template"]
     else:
-        sql_content = sql_query
-        print(f"[DEBUG] No <SQL> tags found; using full response: {sql_content}")
+        sql_content = _sql_from_text(sql_query)
 
     # If the model explicitly indicates a non-select result, block it
-    if sql_content.strip().upper() == "NON_SELECT":
-        print("[DEBUG] Model indicated NON_SELECT; blocking non-SELECT response")
+    if sql_content.upper() == "NON_SELECT":
+        logger.debug("Model indicated NON_SELECT; blocking non-SELECT response")
         return {"error": "Non-SELECT query blocked.", "query": "NON_SELECT"}
 
-    # Block clearly non-SELECT statements (INSERT/UPDATE/DELETE/CREATE/DROP/ALTER/TRUNCATE)
-    if re.search(r"\b(INSERT|UPDATE|DELETE|CREATE|DROP|ALTER|TRUNCATE|GRANT|REVOKE)\b", sql_content, flags=re.IGNORECASE):
-        print(f"[DEBUG] Forbidden SQL command detected in model output: {sql_content}")
+    sql_query = validate_select(sql_content)
+    if sql_query is None:
         return {"error": "Non-SELECT query blocked.", "query": sql_content}
+    return {"query": sql_query, "summary_template": template}
 
-    # Attempt to extract the first SELECT statement
-    sel = re.search(r"(?is)\bSELECT\b.*?(;|$)", sql_content)
-    if not sel:
-        print(f"[DEBUG] No SELECT statement found in model output: {sql_content}")
-        return {"error": "Non-SELECT query blocked.", "query": sql_content}
+# Common scouting questions answered with fixed SQL and a summary template, so
+# they skip both Groq calls. Each entry lists a few phrasings; a question is
+# matched exactly (minus trailing punctuation) or, when sentence-transformers is
+# installed, by embedding similarity to a phrasing that agrees with it on
+# direction words (see _canonical_directions). The queries return a single row
+# so the template always fills locally.
+CANONICAL_QUERIES = [
+    (("which team scores the most fuel", "who scores the most fuel", "best fuel scorer", "top fuel scorer"),
+     "SELECT team, avg_fuel FROM team_stats ORDER BY avg_fuel DESC NULLS LAST LIMIT 1",
+     "Team {team} scores the most fuel, averaging {avg_fuel} per match."),
+    (("which team is the most consistent", "most consistent team", "most consistent fuel scorer"),
+     "SELECT team, fuel_range FROM team_stats WHERE matches > 1 ORDER BY fuel_range, avg_fuel DESC NULLS LAST LIMIT 1",
+     "Team {team} is the most consistent, with a fuel range of {fuel_range} between its best and worst match."),
+    (("which team is the best climber", "who climbs the best", "best climber", "most climb points"),
+     "SELECT team, climb_pts FROM team_stats ORDER BY climb_pts DESC NULLS LAST LIMIT 1",
+     "Team {team} is the best climber, with {climb_pts} teleop climb points."),
+    (("which team scores the most fuel in auto", "best auto scorer", "best autonomous team"),
+     "SELECT team, ROUND(AVG(auto_fuel), 2) AS avg_auto_fuel FROM match_scouting "
+     "GROUP BY team ORDER BY avg_auto_fuel DESC NULLS LAST LIMIT 1",
+     "Team {team} scores the most fuel in auto, averaging {avg_auto_fuel} per match."),
+    (("how many teams have been scouted", "how many teams are there", "number of teams"),
+     "SELECT COUNT(*) AS teams FROM team_stats",
+     "Teams scouted so far: {teams}."),
+    (("how many matches have been scouted", "how many matches are there", "number of matches"),
+     "SELECT COUNT(DISTINCT match) AS matches FROM match_scouting",
+     "Matches scouted so far: {matches}."),
+]
+CANONICAL_MATCH_THRESHOLD = 0.85
+_canonical_phrases = {phrase: i for i, (phrases, _, _) in enumerate(CANONICAL_QUERIES) for phrase in phrases}
+_canonical_embeddings = None  # (entry index per phrase, unit embeddings), built on first use
+_canonical_lock = threading.Lock()
+# MiniLM scores "most" and "least" (or "top fuel scorer" and "top 5 fuel
+# scorers") as near-paraphrases, so an embedding match must also agree on these
+# words, grouped by meaning, and the question must not ask for a number of rows
+# or name a team/match.
+_DIRECTION_WORDS = {
+    "most": "high", "best": "high", "top": "high", "highest": "high",
+    "least": "low", "worst": "low", "bottom": "low", "lowest": "low", "fewest": "low",
+    "consistent": "consistent", "inconsistent": "inconsistent",
+}
+_CANONICAL_EXCLUDE = re.compile(
+    r"\d|\b(?:top|bottom|first|last)\s+(?:two|three|four|five|six|seven|eight|nine|ten)\b")
+
+def _canonical_directions(text: str):
+    """Return the direction groups (see _DIRECTION_WORDS) used in `text`."""
+    return {_DIRECTION_WORDS[w] for w in re.findall(r"[a-z]+", text) if w in _DIRECTION_WORDS}
+
+_canonical_phrase_directions = [_canonical_directions(phrase) for phrase in _canonical_phrases]
 
-    # Use the extracted SELECT statement (trim trailing semicolon)
-    sql_query = sel.group(0).rstrip(';').strip()
+def _canonical_query(question_key: str, embedding):
+    """Return {"query", "summary_template"} for a canonical question, else None."""
+    global _canonical_embeddings
+    index = _canonical_phrases.get(question_key.rstrip("?.! "))
+    if (index is None and embedding is not None and _embedder is not None
+            and not _CANONICAL_EXCLUDE.search(question_key)):
+        with _canonical_lock:
+            if _canonical_embeddings is None:
+                _canonical_embeddings = (
+                    np.array(list(_canonical_phrases.values())),
+                    _embedder.encode(list(_canonical_phrases), normalize_embeddings=True),
+                )
+        owners, matrix = _canonical_embeddings
+        directions = _canonical_directions(question_key)
+        agrees = np.array([d == directions for d in _canonical_phrase_directions])
+        sims = np.where(agrees, matrix @ embedding, -1.0)
+        best = int(np.argmax(sims))
+        if sims[best] >= CANONICAL_MATCH_THRESHOLD:
+            logger.debug("Canonical query match (similarity %.3f)", sims[best])
+            index = int(owners[best])
+    if index is None:
+        return None
+    _, sql_query, template = CANONICAL_QUERIES[index]
+    return {"query": sql_query, "summary_template": template}
 
-    # Fix boolean * integer issues: Postgres won't allow boolean * 15
-    if re.search(r"auto_climb\s*\*\s*15", sql_query, flags=re.IGNORECASE):
-        fixed_sql = re.sub(r"auto_climb\s*\*\s*15",
-                           "(CASE WHEN auto_climb THEN 15 ELSE 0 END)",
-                           sql_query,
-                           flags=re.IGNORECASE)
-        print(f"[DEBUG] Transformed SQL to avoid boolean*int: {fixed_sql}")
-        sql_query = fixed_sql
+def _run_question(question: str, use_cache: bool = True, embedding=None):
+    """Steps 1-2 of the AI pipeline: get vetted SQL and execute it.
 
-    # Final safety check: ensure the extracted query starts with SELECT
-    if not sql_query.upper().lstrip().startswith("SELECT"):
-        print(f"[DEBUG] After extraction, non-SELECT detected: {sql_query}")
-        return {"error": "Non-SELECT query blocked.", "query": sql_query}
+    Canonical questions (see CANONICAL_QUERIES) use their fixed SQL unless
+    use_cache is False; others get SQL from the cache or Groq. The normalized
+    question is only the cache key; the model sees the question as asked,
+    since values such as 'L3' are case-sensitive. With use_cache=False any
+    cached SQL for the question is discarded and regenerated, and the query
+    skips the result cache. Returns {"query", "data", "summary_template"} on
+    success, or a dict with an "error" key.
+    """
+    question_key = _normalize_question(question)
+    generated = _canonical_query(question_key, embedding) if use_cache else None
+    if generated is not None:
+        try:
+            data = run_sql_query(generated["query"])
+        except Exception as e:
+            logger.error("SQL query execution failed: %s", e)
+            return {"error": str(e), "query": generated["query"]}
+        return {**generated, "data": data}
+
+    cache_key = hashlib.sha256(question_key.encode()).hexdigest()
+    with _sql_cache_lock:
+        if not use_cache:
+            SQL_CACHE.pop(cache_key, None)
+        generated = SQL_CACHE.get(cache_key)
+        if generated is not None:
+            SQL_CACHE.move_to_end(cache_key)
+
+    if generated is not None:
+        logger.debug("SQL cache hit: %s", generated['query'])
+    else:
+        generated = _sql_for_question(question.strip())
+        if "error" in generated:
+            return generated
+    sql_query = generated["query"]
 
     # Step 2: Execute SQL
     try:
-        data = run_sql_query(sql_query)
-        print(f"[DEBUG] SQL query executed successfully. Data: {data}")
+        data = run_sql_query(sql_query, use_cache=use_cache)
+        logger.debug("SQL query executed successfully. Data: %s", data)
     except Exception as e:
-        print(f"[ERROR] SQL query execution failed: {e}")
+        logger.error("SQL query execution failed: %s", e)
+        with _sql_cache_lock:
+            SQL_CACHE.pop(cache_key, None)
         return {"error": str(e), "query": sql_query}
 
-    # Step 3: Summarize results
-    summary_prompt = f"User asked: '{question}'. Results: {data}. Provide a simple and clear summary in plain English."
-    print(f"[DEBUG] Sending summary prompt to Groq API: {summary_prompt}")
+    with _sql_cache_lock:
+        SQL_CACHE[cache_key] = generated
+        SQL_CACHE.move_to_end(cache_key)
+        if len(SQL_CACHE) > SQL_CACHE_SIZE:
+            SQL_CACHE.popitem(last=False)
+    return {**generated, "data": data}
+
+def ask_groq(question: str, use_cache: bool = True):
+    """Answer `question` in one piece: the collected events of ask_groq_stream.
+
+    Returns {"query", "data", "summary"} (plus "cached" on an answer-cache
+    hit), or a dict with an "error" key.
+    """
+    result, parts = {}, []
+    for event, payload in ask_groq_stream(question, use_cache):
+        if event == "result":
+            result.update(payload)
+        elif event == "summary":
+            parts.append(payload["delta"])
+        elif event == "error":
+            return {**result, **payload}
+    result["summary"] = "".join(parts).strip()
+    return result
+
+def ask_groq_stream(question: str, use_cache: bool = True):
+    """Like ask_groq, but yields (event, payload) pairs as the answer is built.
+
+    The SQL and rows are sent as a "result" event as soon as they are known,
+    followed by the summary as a series of "summary" deltas and a final "done".
+    Failures are reported as a single "error" event.
+    """
+    question_key = _normalize_question(question)
+    embedding = _embed_question(question_key)
+    cached = lookup_answer(question_key, embedding) if use_cache else None
+    if cached is not None:
+        logger.debug("Answer cache hit")
+        yield "result", {"query": cached["query"], "data": cached["data"], "cached": True}
+        yield "summary", {"delta": cached["summary"]}
+        yield "done", {}
+        return
+
+    result = _run_question(question, use_cache, embedding)
+    if "error" in result:
+        yield "error", result
+        return
+    template = result.pop("summary_template")
+    yield "result", result
 
+    # Step 3: Stream the summary (or fill it locally from the template)
+    parts = []
     try:
-        summary = client.chat.completions.create(
-            model="llama-3.3-70b-versatile",
-            messages=[{"role": "user", "content": summary_prompt}],
-        )
-        summary_text = summary.choices[0].message.content.strip()
-        print(f"[DEBUG] Groq API summary response: {summary_text}")
+        for delta in _summarize_stream(question, result["query"], result["data"], template, use_cache):
+            parts.append(delta)
+            yield "summary", {"delta": delta}
     except Exception as e:
-        print(f"[ERROR] Groq API summary call failed: {e}")
-        return {"error": str(e), "query": sql_query, "data": data}
+        logger.error("Groq API summary call failed: %s", e)
+        yield "error", {"error": str(e), "query": result["query"]}
+        return
 
-    return {
-        "query": sql_query,
-        "data": data,
-        "summary": summary_text,
-    }
+    result["summary"] = "".join(parts).strip()
+    store_answer(question_key, embedding, result)
+    yield "done", {}
 
 # Ensure the insert_data_to_db function is defined
 
-def insert_data_to_db(record: dict):
-    """Inserts data into the PostgreSQL database."""
-    sql = """
-    INSERT INTO match_scouting (
-        match, team, alliance, fuel_balls, auto_fuel, alliance_pass,
-        is_turreted, fits_trench, climb, auto_climb, notes,
-        defense, passing
-    ) VALUES (
-        %(match)s, %(team)s, %(alliance)s, %(fuel_balls)s, %(auto_fuel)s, %(alliance_pass)s,
-        %(is_turreted)s, %(fits_trench)s, %(climb)s, %(auto_climb)s, %(notes)s,
-        %(defense)s, %(passing)s
-    )
+# Submissions are first written to an UNLOGGED staging table (no WAL, so no
+# fsync per commit) and moved into match_scouting by merge_staged_rows() every
+# STAGE_MERGE_INTERVAL seconds. A Postgres crash can lose at most that window.
+STAGE_MERGE_INTERVAL = float(os.getenv("DB_MERGE_INTERVAL", "5"))
+INSERT_COLUMNS = """
+    match, team, alliance, fuel_balls, auto_fuel, alliance_pass,
+    is_turreted, fits_trench, climb, auto_climb, notes,
+    defense, passing
+"""
+COPY_FIELDS = [c.strip() for c in INSERT_COLUMNS.split(",")]
+COPY_SQL = f"COPY match_scouting_stage ({INSERT_COLUMNS}, submission_id) FROM STDIN"
+_COPY_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+# Staged rows carry their submission_id so the merge can report per-row
+# outcomes. LIKE doesn't copy UNIQUE or foreign-key constraints, so a row can
+# stage fine and still fail the merge; such rows end up in
+# match_scouting_rejects instead of blocking every later merge.
+CREATE_STAGE_SQL = """
+CREATE UNLOGGED TABLE IF NOT EXISTS match_scouting_stage
+    (LIKE match_scouting INCLUDING DEFAULTS INCLUDING CONSTRAINTS);
+ALTER TABLE match_scouting_stage ADD COLUMN IF NOT EXISTS submission_id TEXT;
+CREATE TABLE IF NOT EXISTS match_scouting_rejects
+    (LIKE match_scouting_stage, error TEXT, rejected_at TIMESTAMPTZ DEFAULT now());
+"""
+# DELETE ... RETURNING (rather than INSERT ... SELECT then TRUNCATE) only moves
+# the rows it actually copied. Staged rows already hold their id, drawn from
+# match_scouting's sequence by the copied column default.
+MERGE_STAGE_SQL = f"""
+WITH staged AS (DELETE FROM match_scouting_stage RETURNING *),
+merged AS (
+    INSERT INTO match_scouting (id, {INSERT_COLUMNS})
+    SELECT id, {INSERT_COLUMNS} FROM staged ORDER BY id
+)
+SELECT submission_id FROM staged
+"""
+MERGE_ROW_SQL = f"""
+WITH staged AS (DELETE FROM match_scouting_stage WHERE id = %(id)s RETURNING *)
+INSERT INTO match_scouting (id, {INSERT_COLUMNS})
+SELECT id, {INSERT_COLUMNS} FROM staged
+"""
+REJECT_ROW_SQL = f"""
+WITH staged AS (DELETE FROM match_scouting_stage WHERE id = %(id)s RETURNING *)
+INSERT INTO match_scouting_rejects (id, {INSERT_COLUMNS}, submission_id, error)
+SELECT id, {INSERT_COLUMNS}, submission_id, %(error)s FROM staged
+"""
+# Per-team aggregates the AI is told about (see SYSTEM_PROMPT), refreshed
+# whenever staged rows are merged. The unique index allows REFRESH CONCURRENTLY,
+# so readers never block on a refresh.
+CREATE_TEAM_STATS_SQL = """
+CREATE INDEX IF NOT EXISTS idx_match_scouting_team_match ON match_scouting (team, match);
+CREATE MATERIALIZED VIEW IF NOT EXISTS team_stats AS
+SELECT team,
+       COUNT(*) AS matches,
+       ROUND(AVG(fuel_balls), 2) AS avg_fuel,
+       MAX(fuel_balls) - MIN(fuel_balls) AS fuel_range,
+       SUM(CASE climb WHEN 'L3' THEN 30 WHEN 'L2' THEN 20 WHEN 'L1' THEN 10 ELSE 0 END) AS climb_pts
+FROM match_scouting
+WHERE team IS NOT NULL
+GROUP BY team;
+CREATE UNIQUE INDEX IF NOT EXISTS idx_team_stats_team ON team_stats (team);
+"""
+_schema_ready = False
+_schema_lock = threading.Lock()
+
+def _ensure_schema(conn):
+    """Create the staging table, index and team_stats view once per process.
+
+    Runs in its own transaction, so call it before starting any other work on
+    `conn`. The flag is only set once that transaction has committed; a failed
+    or rolled-back setup is retried on the next call.
     """
-    conn = None
+    global _schema_ready
+    if not _schema_ready:
+        with _schema_lock:
+            if not _schema_ready:
+                with conn, conn.cursor() as cur:
+                    cur.execute(CREATE_STAGE_SQL)
+                    cur.execute(CREATE_TEAM_STATS_SQL)
+                _schema_ready = True
+
+def _copy_value(value):
+    """Formats one value for COPY's text format."""
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    return str(value).translate(_COPY_ESCAPES)
+
+def _copy_rows(records):
+    """Serializes records as a COPY text-format buffer, one line per record."""
+    buf = io.StringIO()
+    for record in records:
+        buf.write("\t".join([_copy_value(record[field]) for field in COPY_FIELDS]))
+        buf.write("\t")
+        buf.write(_copy_value(record.get('submission_id')))
+        buf.write("\n")
+    buf.seek(0)
+    return buf
+
+def insert_data_to_db(records):
+    """Stages one or more records for the database in a single transaction.
+
+    Streams the batch through COPY FROM STDIN, which skips the per-row
+    statement parsing an INSERT ... VALUES pays. Rows reach match_scouting
+    on the next merge_staged_rows(); until then they are only "staged".
+    """
+    if isinstance(records, dict):
+        records = [records]
     try:
-        conn = psycopg2.connect(DB_URL)
-        cur = conn.cursor()
-        cur.execute(sql, record)
-        conn.commit()
-        cur.close()
-        return "DB insert successful"
+        buf = _copy_rows(records)
+        with get_conn() as conn:
+            _ensure_schema(conn)
+            # `with conn` commits on success and rolls back on error
+            with conn, conn.cursor() as cur:
+                cur.copy_expert(COPY_SQL, buf)
+        return "DB staged"
     except Exception as e:
-        if conn: conn.rollback()
-        print(f"[ERROR] Database insertion failed: {e}")
+        logger.error("Database insertion failed: %s", e)
         return f"DB failed: {e}"
-    finally:
-        if conn: conn.close()
+
+def _merge_rows_individually(cur):
+    """Merge staged rows one at a time, moving any that fail to the rejects
+    table; return (merged submission ids, [(submission id, error)])."""
+    cur.execute("SELECT id, submission_id FROM match_scouting_stage ORDER BY id")
+    merged, rejected = [], []
+    for row_id, submission_id in cur.fetchall():
+        cur.execute("SAVEPOINT merge_row")
+        try:
+            cur.execute(MERGE_ROW_SQL, {"id": row_id})
+            merged.append(submission_id)
+        except psycopg2.Error as e:
+            error = str(e).strip()
+            logger.warning("Staged row %s rejected: %s", row_id, error)
+            cur.execute("ROLLBACK TO SAVEPOINT merge_row")
+            cur.execute(REJECT_ROW_SQL, {"id": row_id, "error": error})
+            rejected.append((submission_id, error))
+        cur.execute("RELEASE SAVEPOINT merge_row")
+    return merged, rejected
+
+def merge_staged_rows():
+    """Move staged rows into match_scouting and refresh team_stats in one
+    transaction; return (merged submission ids, [(submission id, error)]).
+
+    If the bulk merge fails, rows are merged one by one so a single bad row
+    is rejected instead of holding back the rest.
+    """
+    with get_conn() as conn:
+        _ensure_schema(conn)
+        with conn, conn.cursor() as cur:
+            cur.execute("SAVEPOINT bulk_merge")
+            try:
+                cur.execute(MERGE_STAGE_SQL)
+                merged, rejected = [row[0] for row in cur.fetchall()], []
+            except psycopg2.Error as e:
+                logger.warning("Bulk merge failed, merging staged rows one by one: %s", e)
+                cur.execute("ROLLBACK TO SAVEPOINT bulk_merge")
+                merged, rejected = _merge_rows_individually(cur)
+            if merged:
+                cur.execute("REFRESH MATERIALIZED VIEW CONCURRENTLY team_stats")
+            return merged, rejected
+
+
+CSV_FIELDNAMES = [
+    'match', 'team', 'alliance', 'fuel_balls', 'auto_fuel', 'alliance_pass',
+    'is_turreted', 'fits_trench', 'climb', 'auto_climb', 'notes',
+    'defense'
+]
+_csv_lock = threading.Lock()
+_csv_columns = None  # header of CURRENT_CSV, read once and then tracked in memory
+_csv_fp = None  # append handle kept open between batches
+
+
+def _load_csv_columns():
+    """Return the header currently on disk, or None if the file is missing/empty."""
+    if not os.path.exists(CURRENT_CSV) or os.path.getsize(CURRENT_CSV) == 0:
+        return None
+    with open(CURRENT_CSV, newline='') as f:
+        return next(csv.reader(f), None)
+
+
+def _csv_append_handle():
+    """Return the long-lived append handle for CURRENT_CSV, opening it if needed."""
+    global _csv_fp
+    if _csv_fp is None or _csv_fp.closed:
+        _csv_fp = open(CURRENT_CSV, 'a', newline='')
+    return _csv_fp
+
+
+def _close_csv_handle():
+    global _csv_fp
+    if _csv_fp is not None and not _csv_fp.closed:
+        _csv_fp.close()
+    _csv_fp = None
+
+
+def _to_int(value):
+    """int() for CSV fields, skipping the conversion for values JSON already made ints."""
+    # `type(...) is int` rather than isinstance, so booleans still become 1/0
+    return value if type(value) is int else int(value or 0)
 
 
-def append_to_csv(record: dict):
-    """Append a scouting record to CURRENT_CSV with consistent columns and types.
+def _csv_row(record: dict):
+    """Return a submitted record as a CSV_FIELDNAMES-ordered tuple with CSV-friendly types.
+
+    Built directly as a tuple (no intermediate dict) since this runs for every row.
+    Booleans become 1/0 and auto_climb becomes 10/0.
+    """
+    get = record.get
+    return (
+        _to_int(get('match')),
+        _to_int(get('team')),
+        get('alliance') or '',
+        _to_int(get('fuel_balls')),
+        _to_int(get('auto_fuel')),
+        _to_int(get('alliance_pass')),
+        1 if get('is_turreted') else 0,
+        1 if get('fits_trench') else 0,
+        get('climb') or 'no_climb',
+        10 if get('auto_climb') else 0,
+        get('notes') or '',
+        1 if get('defense') else 0,
+    )
+
+
+def append_to_csv(records):
+    """Append one or more scouting records to CURRENT_CSV with consistent columns and types.
 
     This mirrors the columns used by `insert_data_to_db` so CSV and DB stay aligned.
     Booleans are written as integers (1/0) for portability.
+
+    The header is read from disk once and cached, and the file stays open in append
+    mode between batches, so the common case is one buffered write plus a flush.
+    The file is only rewritten when its header is missing one of CSV_FIELDNAMES
+    (e.g. a CSV left over from an older version of the app).
     """
+    global _csv_columns
+    if isinstance(records, dict):
+        records = [records]
     try:
-        fieldnames = [
-            'match', 'team', 'alliance', 'fuel_balls', 'auto_fuel', 'alliance_pass',
-            'is_turreted', 'fits_trench', 'climb', 'auto_climb', 'notes',
-            'defense'
-        ]
-
-        # Normalize values and ensure keys exist
-        normalized = {}
-        normalized['match'] = int(record.get('match') or 0)
-        normalized['team'] = int(record.get('team') or 0)
-        normalized['alliance'] = record.get('alliance') or ''
-        normalized['fuel_balls'] = int(record.get('fuel_balls') or 0)
-        normalized['auto_fuel'] = int(record.get('auto_fuel') or 0)
-        normalized['alliance_pass'] = int(record.get('alliance_pass') or 0)
-
-        # Booleans -> 1/0
-        normalized['is_turreted'] = 1 if bool(record.get('is_turreted')) else 0
-        normalized['fits_trench'] = 1 if bool(record.get('fits_trench')) else 0
-
-        normalized['climb'] = record.get('climb') or 'no_climb'
-        normalized['auto_climb'] = 10 if bool(record.get('auto_climb')) else 0
-        normalized['notes'] = record.get('notes') or ''
-
-        normalized['defense'] = 1 if bool(record.get('defense')) else 0
-
-        df = pd.DataFrame([normalized], columns=fieldnames)
-
-        # Write header if file doesn't exist or is empty
-        write_header = not os.path.exists(CURRENT_CSV) or os.path.getsize(CURRENT_CSV) == 0
-        if write_header:
-            df.to_csv(CURRENT_CSV, mode='w', header=True, index=False)
-        else:
-            df.to_csv(CURRENT_CSV, mode='a', header=False, index=False)
+        rows = [_csv_row(r) for r in records]
+
+        with _csv_lock:
+            if _csv_columns is not None and not os.path.exists(CURRENT_CSV):
+                # The CSV was moved or deleted while the hub was running; start a new one
+                _close_csv_handle()
+                _csv_columns = None
+            if _csv_columns is None:
+                _csv_columns = _load_csv_columns()
+
+            if _csv_columns is None:
+                # New or empty file: write the header along with the first rows
+                f = _csv_append_handle()
+                writer = csv.writer(f, quoting=csv.QUOTE_MINIMAL)
+                writer.writerow(CSV_FIELDNAMES)
+                writer.writerows(rows)
+                f.flush()
+                _csv_columns = list(CSV_FIELDNAMES)
+            elif _csv_columns == CSV_FIELDNAMES:
+                # Fast path: header matches exactly, so rows go straight to the C writer
+                f = _csv_append_handle()
+                csv.writer(f, quoting=csv.QUOTE_MINIMAL).writerows(rows)
+                f.flush()
+            elif all(col in _csv_columns for col in CSV_FIELDNAMES):
+                # Header covers every column but in a different order (or with extras)
+                f = _csv_append_handle()
+                csv.DictWriter(f, fieldnames=_csv_columns, extrasaction='ignore').writerows(
+                    dict(zip(CSV_FIELDNAMES, row)) for row in rows)
+                f.flush()
+            else:
+                # Slow path: widen the header to the union of columns and rewrite once.
+                # The append handle must be closed first (Windows can't replace open files).
+                _close_csv_handle()
+                columns = _csv_columns + [c for c in CSV_FIELDNAMES if c not in _csv_columns]
+                tmp_path = CURRENT_CSV + '.tmp'
+                with open(CURRENT_CSV, newline='') as src, open(tmp_path, 'w', newline='') as dst:
+                    writer = csv.DictWriter(dst, fieldnames=columns, extrasaction='ignore')
+                    writer.writeheader()
+                    writer.writerows(csv.DictReader(src))
+                    writer.writerows(dict(zip(CSV_FIELDNAMES, row)) for row in rows)
+                os.replace(tmp_path, CURRENT_CSV)
+                _csv_columns = columns
 
         return "CSV updated successfully"
     except Exception as e:
-        print(f"CSV Error: {e}")
+        logger.exception("CSV Error: %s", e)
         return f"Failed to append: {e}"
 
+
+# --- Background submission writer ---
+# Submissions are queued and a single thread writes them to the CSV and the
+# database in batches, so the request thread never waits on disk or DB I/O.
+WRITE_BATCH_MAX = 500
+WRITE_BATCH_WAIT = 0.05  # seconds to wait for more records before flushing a batch
+WRITE_BATCH_MAX_DELAY = 1.0  # never hold the first record of a batch longer than this
+_write_q = queue.Queue()
+_writer_thread = None
+_writer_start_lock = threading.Lock()
+
+# Write outcome of recent submissions for /submit_status, keyed by the
+# submission_id handed out by /submit_json, plus the latest id per (team, match)
+SUBMIT_STATUS_SIZE = 2000
+_submit_status = OrderedDict()
+_submission_ids = {}
+_submit_status_lock = threading.Lock()
+
+
+def _set_submit_status(records, **fields):
+    """Update the tracked status of each record, evicting the oldest entries."""
+    with _submit_status_lock:
+        for record in records:
+            submission_id = record.get('submission_id')
+            if submission_id is None:
+                continue
+            status = _submit_status.pop(submission_id, None)
+            if status is None:
+                status = {
+                    "submission_id": submission_id,
+                    "team": str(record.get('team')),
+                    "match": str(record.get('match')),
+                    "csv_status": "queued",
+                    "db_status": "queued",
+                }
+                _submission_ids[status["team"], status["match"]] = submission_id
+            status.update(fields)
+            _submit_status[submission_id] = status
+        while len(_submit_status) > SUBMIT_STATUS_SIZE:
+            old_id, old = _submit_status.popitem(last=False)
+            if _submission_ids.get((old["team"], old["match"])) == old_id:
+                del _submission_ids[old["team"], old["match"]]
+
+
+def _update_submit_status(submission_ids, **fields):
+    """Update the status of already tracked submissions; others are ignored."""
+    with _submit_status_lock:
+        for submission_id in submission_ids:
+            status = _submit_status.get(submission_id)
+            if status is not None:
+                status.update(fields)
+
+
+def _write_batch(records):
+    """Persist a batch to the CSV and the database."""
+    csv_status = append_to_csv(records)
+    if csv_status != "CSV updated successfully" and len(records) > 1:
+        # Rows are converted before anything is written, so one unconvertible
+        # record fails the batch without a partial write; retry individually so
+        # the rest of the batch still lands.
+        statuses = [append_to_csv(r) for r in records]
+        for record, status in zip(records, statuses):
+            _set_submit_status([record], csv_status=status)
+        failed = sum(1 for st in statuses if st != "CSV updated successfully")
+        csv_status = f"{len(records) - failed} written, {failed} failed"
+    else:
+        _set_submit_status(records, csv_status=csv_status)
+    logger.debug("CSV status for %s record(s): %s", len(records), csv_status)
+
+    db_status = insert_data_to_db(records)
+    if db_status != "DB staged" and len(records) > 1:
+        # One bad record fails the whole statement; retry individually so the
+        # rest of the batch still lands.
+        statuses = [insert_data_to_db(r) for r in records]
+        for record, status in zip(records, statuses):
+            _set_submit_status([record], db_status=status)
+        failed = sum(1 for st in statuses if st != "DB staged")
+        db_status = f"{len(records) - failed} staged, {failed} failed"
+    else:
+        _set_submit_status(records, db_status=db_status)
+    logger.debug("Database status for %s record(s): %s", len(records), db_status)
+
+
+def _merge_stage():
+    """Merge staged rows; return False (to retry later) if the merge failed."""
+    try:
+        merged, rejected = merge_staged_rows()
+    except Exception as e:
+        logger.exception("Merging staged rows failed: %s", e)
+        return False
+    logger.debug("Merged %s staged row(s) into match_scouting, rejected %s", len(merged), len(rejected))
+    _update_submit_status(merged, db_status="DB insert successful")
+    for submission_id, error in rejected:
+        _update_submit_status([submission_id], db_status=f"DB failed: {error}")
+    if merged:
+        # cached query results and AI answers no longer reflect the data
+        clear_query_cache()
+        clear_answer_cache()
+    return True
+
+
+def _writer_loop():
+    """Drain _write_q in batches, write each batch in one pass, and merge the
+    staging table at most STAGE_MERGE_INTERVAL seconds after rows land in it."""
+    merge_due = time.monotonic()  # pick up rows left staged by a previous run
+    while True:
+        try:
+            timeout = None if merge_due is None else max(0.0, merge_due - time.monotonic())
+            batch = [_write_q.get(timeout=timeout)]
+        except queue.Empty:
+            merge_due = None if _merge_stage() else time.monotonic() + STAGE_MERGE_INTERVAL
+            continue
+        deadline = time.monotonic() + WRITE_BATCH_MAX_DELAY
+        while batch[-1] is not None and len(batch) < WRITE_BATCH_MAX:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(_write_q.get(timeout=min(WRITE_BATCH_WAIT, remaining)))
+            except queue.Empty:
+                break
+
+        records = [r for r in batch if r is not None]
+        if records:
+            _write_batch(records)
+            if merge_due is None:
+                merge_due = time.monotonic() + STAGE_MERGE_INTERVAL
+        if batch[-1] is None:
+            _merge_stage()
+            return
+        if merge_due is not None and time.monotonic() >= merge_due:
+            merge_due = None if _merge_stage() else time.monotonic() + STAGE_MERGE_INTERVAL
+
+
+def queue_submission(record: dict):
+    """Queue a record for the background writer, starting it on first use."""
+    global _writer_thread
+    with _writer_start_lock:
+        if _writer_thread is None:
+            _writer_thread = threading.Thread(target=_writer_loop, name="submission-writer", daemon=True)
+            _writer_thread.start()
+    _write_q.put(record)
+
+
+@atexit.register
+def _flush_writes():
+    """Let the writer finish any queued records before the process exits."""
+    if _writer_thread is not None and _writer_thread.is_alive():
+        _write_q.put(None)
+        _writer_thread.join(timeout=5)
+    with _csv_lock:
+        _close_csv_handle()
+
 @app.route('/submit_json', methods=['POST'])
 def submit_json():
     data = request.get_json()
     if not data:
-        print("[DEBUG] No data received in /submit_json")
+        logger.debug("No data received in /submit_json")
         return jsonify({"error": "No data"}), 400
 
-    print(f"[DEBUG] Data received: {data}")
+    logger.debug("Data received: %s", data)
 
     if 'notes' not in data:
         data['notes'] = ""  # Default to an empty string if 'notes' is missing
@@ -319,38 +1350,91 @@ def submit_json():
     # Convert 'auto_climb' to points (10 if true, 0 if false)
     data['auto_climb'] = 10 if bool(data.get('auto_climb', 0)) else 0
 
-    csv_status = append_to_csv(data)
-    print(f"[DEBUG] CSV status: {csv_status}")
-
-    db_status = insert_data_to_db(data)
-    print(f"[DEBUG] Database status: {db_status}")
+    # CSV and DB writes happen on the background writer; respond right away.
+    # Their outcome is reported by /submit_status/<submission_id>.
+    data['submission_id'] = uuid.uuid4().hex
+    _set_submit_status([data])
+    queue_submission(data)
+    processed_data.append(data)
 
     return jsonify({
-        "csv_status": csv_status,
-        "db_status": db_status
-    })
+        "message": "Submission queued",
+        "submission_id": data['submission_id'],
+        "csv_status": "CSV write queued",
+        "db_status": "DB insert queued"
+    }), 202
+
+@app.route('/submit_status/<submission_id>', methods=['GET'])
+def submit_status(submission_id):
+    """Report whether a submission has been written to the CSV and the database."""
+    with _submit_status_lock:
+        status = _submit_status.get(submission_id)
+        status = dict(status) if status is not None else None
+    if status is None:
+        return jsonify({"error": "Unknown or expired submission_id"}), 404
+    return jsonify(status)
+
+@app.route('/submit_status/<team>/<match>', methods=['GET'])
+def submit_status_for_match(team, match):
+    """Like /submit_status/<submission_id>, for the latest submission for a team and match."""
+    with _submit_status_lock:
+        status = _submit_status.get(_submission_ids.get((team, match)))
+        status = dict(status) if status is not None else None
+    if status is None:
+        return jsonify({"error": "No recent submission for this team and match"}), 404
+    return jsonify(status)
+
+@app.route('/recent', methods=['GET'])
+def recent():
+    """Return the most recent submissions received by this hub (up to 1000)."""
+    return jsonify(list(processed_data))
 
 @app.route('/ask', methods=['POST'])
 def ask():
-    question = request.get_json().get("question")
-    print(f"[DEBUG] AI question received: {question}")
+    """Answer an AI question as a Server-Sent Events stream (see ask_groq_stream).
 
-    result = ask_groq(question)
-    print(f"[DEBUG] AI result: {result}")
+    Pass ?no_cache=1 to skip canonical-question matching and every cache (answer,
+    SQL, query-result and summary); the fresh results are still cached.
+    """
+    data = request.get_json(silent=True)
+    question = data.get("question") if isinstance(data, dict) else None
+    if not isinstance(question, str) or not question.strip():
+        # Checked before streaming: once the event stream starts, the status is already 200
+        logger.error("No question provided in the request.")
+        return jsonify({"error": "No question provided."}), 400
+    use_cache = request.args.get("no_cache") != "1"
+    logger.debug("AI question received: %s", question)
+
+    def generate():
+        for event, payload in ask_groq_stream(question, use_cache):
+            # Always compact: an indented payload would span several SSE data lines.
+            data = orjson.dumps(payload, default=app.json.default, option=ORJSON_OPTIONS).decode()
+            yield f"event: {event}\ndata: {data}\n\n"
 
-    return jsonify(result)
+    return Response(stream_with_context(generate()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache"})
 
 # --- Ngrok & Startup ---
+_http = requests.Session()  # reused for the local ngrok API probes
+NGROK_START_TIMEOUT = 10  # seconds to wait for a freshly started tunnel
+
+def _ngrok_api_listening():
+    """Cheap TCP check for ngrok's local API before making any HTTP request to it."""
+    with socket.socket() as sock:
+        sock.settimeout(0.2)
+        return sock.connect_ex(("127.0.0.1", 4040)) == 0
+
 def start_ngrok():
     try:
         # Check if Ngrok is already running
-        response = requests.get("http://127.0.0.1:4040/api/tunnels")
-        if response.status_code == 200:
-            tunnels = response.json().get("tunnels", [])
-            if tunnels:
-                public_url = tunnels[0]["public_url"]
-                print(f"Ngrok is already running at: {public_url}")
-                return
+        if _ngrok_api_listening():
+            response = _http.get("http://127.0.0.1:4040/api/tunnels")
+            if response.status_code == 200:
+                tunnels = response.json().get("tunnels", [])
+                if tunnels:
+                    public_url = tunnels[0]["public_url"]
+                    logger.info("Ngrok is already running at: %s", public_url)
+                    return
     except requests.ConnectionError:
         # Ngrok is not running, so start it
         pass
@@ -358,24 +1442,45 @@ def start_ngrok():
     try:
         # Updated to forward HTTP traffic instead of HTTPS to avoid malformed requests
         subprocess.Popen(["ngrok", "http", "5000", "--pooling-enabled"], stdout=subprocess.DEVNULL)
-        time.sleep(5)  # Increased delay to allow Ngrok to start
-        response = requests.get("http://127.0.0.1:4040/api/tunnels")
-        tunnels = response.json().get("tunnels", [])
+
+        # Poll the local API until the tunnel is up instead of sleeping a fixed time
+        tunnels = []
+        deadline = time.monotonic() + NGROK_START_TIMEOUT
+        while time.monotonic() < deadline:
+            if not _ngrok_api_listening():
+                time.sleep(0.1)
+                continue
+            try:
+                response = _http.get("http://127.0.0.1:4040/api/tunnels", timeout=0.2)
+                if response.ok:
+                    tunnels = response.json().get("tunnels", [])
+                    if tunnels:
+                        break
+            except requests.RequestException:
+                pass  # API not ready yet
+            time.sleep(0.1)
+
         if tunnels:
             public_url = tunnels[0]["public_url"]
-            print(f"Ngrok tunnel available at: {public_url}")
+            logger.info("Ngrok tunnel available at: %s", public_url)
         else:
-            print("Ngrok started, but no tunnels were found. Check Ngrok configuration.")
+            logger.warning("Ngrok started, but no tunnels were found within %ss. Check Ngrok configuration.", NGROK_START_TIMEOUT)
     except Exception as e:
-        print(f"Failed to start Ngrok: {e}")
+        logger.exception("Failed to start Ngrok: %s", e)
 
 if __name__ == '__main__':
-    # Only start ngrok in the main process (not the reloader process)
-    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+    if os.getenv('FLASK_ENV') == 'development':
+        # Werkzeug dev server with the debugger and reloader, for local work only.
+        # The reloader re-runs this module in a child process; start ngrok there
+        # so only one tunnel is launched.
+        if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+            threading.Thread(target=start_ngrok, daemon=True).start()
+        app.config['SEND_FILE_MAX_AGE_DEFAULT'] = 0
+        app.run(host='127.0.0.1', port=5000, debug=True)
+    else:
         threading.Thread(target=start_ngrok, daemon=True).start()
 
-    # Add this line to disable caching for development
-    app.config['SEND_FILE_MAX_AGE_DEFAULT'] = 0
-
-    # Bind to 127.0.0.1 for reliable localhost access (IPv4 only)
-    app.run(host='127.0.0.1', port=5000, debug=True)
\ No newline at end of file
+        # Serve with waitress instead of the Werkzeug dev server: a production WSGI
+        # server with a real thread pool (and it runs on Windows, unlike gunicorn).
+        # Bind to 127.0.0.1 for reliable localhost access (IPv4 only).
+        serve(app, host='127.0.0.1', port=5000, threads=16)